@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zipfile
+
+import requests
+
+from pipeline import make_temp_file
+
+# Response headers worth keeping alongside each asset
+KEPT_HEADERS = ('Content-Type', 'Content-Length', 'ETag', 'Last-Modified', 'Cache-Control')
+
+
+class AssetArchive:
+    """Single-file archive of every remote asset a run fetched, for offline and reproducible runs.
+
+    In 'record' mode each URL is fetched once over the network and stored, with its status
+    code and the main response headers, in a zip next to the day's JSON. Identical content
+    fetched from several URLs is stored once. A recording goes to a hidden temp file that
+    only replaces the day's archive on close(), so a run that dies keeps the previous one.
+    In 'replay' mode every fetch is served from that zip and the network is never touched;
+    a URL that was not recorded is an error.
+    """
+
+    def __init__(self, path, mode):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown asset archive mode '{mode}'")
+        self.path = path
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.stats = {'fetched': 0, 'served': 0}
+        if mode == 'record':
+            fd, self.tmp_path = make_temp_file(os.path.dirname(path) or ".")
+            os.close(fd)
+            self.zip = zipfile.ZipFile(self.tmp_path, 'w', zipfile.ZIP_STORED)  # Images are already compressed
+            self.index = {}
+        else:
+            self.zip = zipfile.ZipFile(path, 'r')
+            self.index = json.loads(self.zip.read('index.json'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(discard=exc_type is not None)
+
+    def fetch(self, url):
+        """Return (status_code, content) for url, from the archive when it has been recorded."""
+        with self.lock:
+            entry = self.index.get(url)
+            if entry is not None:
+                self.stats['served'] += 1
+                content = self.zip.read(f"assets/{entry['sha256']}") if entry['sha256'] else b""
+                return entry['status_code'], content
+            if self.mode == 'replay':
+                raise Exception(f"{url} is not in the asset archive {self.path}")
+
+        # Record mode: fetch outside the lock, then store it
+        response = requests.get(url)
+        content = response.content if response.status_code == 200 else b""
+        with self.lock:
+            if url not in self.index:
+                sha256 = hashlib.sha256(content).hexdigest() if content else None
+                if sha256 and f"assets/{sha256}" not in self.zip.NameToInfo:
+                    self.zip.writestr(f"assets/{sha256}", content)
+                self.index[url] = {
+                    'sha256': sha256,
+                    'status_code': response.status_code,
+                    'headers': {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers},
+                    'fetched_at': time.time(),
+                }
+                self.stats['fetched'] += 1
+        return response.status_code, content
+
+    def close(self, discard=False):
+        """Finish the archive; with discard, a recording is thrown away and the previous archive is kept."""
+        if self.zip is None:
+            return
+        if self.mode == 'record' and not discard:
+            self.zip.writestr('index.json', json.dumps(self.index, indent=1), compress_type=zipfile.ZIP_DEFLATED)
+        self.zip.close()
+        self.zip = None
+        if self.mode == 'record':
+            if discard:
+                os.remove(self.tmp_path)
+            else:
+                os.replace(self.tmp_path, self.path)  # Readers only ever see the old archive or the complete new one
+
+    def summary(self):
+        if self.mode == 'record':
+            return f"Asset archive: recorded {self.stats['fetched']} asset(s) to {self.path}"
+        return f"Asset archive: served {self.stats['served']} asset(s) from {self.path}"
@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+
+class CanvasPool:
+    """Reusable blank canvases keyed by mode, size and background colour.
+
+    acquire() hands out a canvas that is already filled with its background colour, exactly
+    like Image.new() would return it. release() clears the canvas and keeps it for the next
+    acquire() of the same key. Only canvases handed out by the pool are taken back, and at
+    most max_canvases are kept, dropping the least recently used sizes first.
+    """
+
+    def __init__(self, max_canvases=32, max_per_key=4):
+        self.max_canvases = max_canvases
+        self.max_per_key = max_per_key
+        self.lock = threading.Lock()
+        self.free = OrderedDict()  # (mode, size, color) -> [canvas, ...], least recently used first
+        self.borrowed = {}  # id(canvas) -> key
+        self.pooled = 0
+        self.stats = {'acquired': 0, 'reused': 0, 'released': 0, 'dropped': 0}
+
+    def acquire(self, mode, size, color=0):
+        key = (mode, tuple(size), color)
+        with self.lock:
+            self.stats['acquired'] += 1
+            canvases = self.free.get(key)
+            if canvases:
+                canvas = canvases.pop()
+                self.pooled -= 1
+                self.free.move_to_end(key)
+                self.stats['reused'] += 1
+                self.borrowed[id(canvas)] = key
+                return canvas
+        canvas = Image.new(mode, size, color)
+        with self.lock:
+            self.borrowed[id(canvas)] = key
+        return canvas
+
+    def release(self, canvas):
+        """Give a canvas back once nothing uses it any more; images that did not come from the pool are ignored."""
+        if canvas is None:
+            return
+        with self.lock:
+            key = self.borrowed.pop(id(canvas), None)
+        if key is None or key[:2] != (canvas.mode, canvas.size):
+            return
+
+        # Clear outside the lock so other threads are not held up by the fill
+        canvas.paste(key[2], (0, 0) + canvas.size)
+        with self.lock:
+            self.stats['released'] += 1
+            canvases = self.free.setdefault(key, [])
+            self.free.move_to_end(key)
+            if len(canvases) >= self.max_per_key:
+                self.stats['dropped'] += 1
+                return
+            canvases.append(canvas)
+            self.pooled += 1
+            while self.pooled > self.max_canvases:
+                oldest_key, oldest = next(iter(self.free.items()))
+                if oldest:
+                    oldest.pop()
+                    self.pooled -= 1
+                    self.stats['dropped'] += 1
+                if not oldest:
+                    del self.free[oldest_key]
+
+    def summary(self):
+        stats = self.stats
+        return (f"Canvas pool: {stats['reused']} of {stats['acquired']} canvas(es) reused, {stats['released']} returned, "
+                f"{stats['dropped']} dropped, {self.pooled} pooled, {len(self.borrowed)} still out")
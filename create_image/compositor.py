@@ -0,0 +1,107 @@
+import threading
+from functools import lru_cache
+
+from PIL import Image
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, merge_images falls back to pasting into new canvases
+    np = None
+
+
+def buffer_view(array, mode):
+    """Return a writable PIL image of mode 'L' or 'RGB' that shares memory with array.
+
+    Pillow stores RGB pixels in 4 bytes, so an 'RGB' view maps an (height, width, 4) array
+    and an 'L' view an (height, width) one. This is what Image.frombuffer() does for its
+    mappable modes, except that frombuffer() would map RGB data as 'RGBX', which PNG can't
+    be written from, and marks the image read-only so the first paste into it would copy.
+    """
+    height, width = array.shape[:2]
+    stride = width if mode == "L" else width * 4
+    return Image.new(mode, (0, 0))._new(Image.core.map_buffer(array, (width, height), "raw", 0, (mode, stride, 1)))
+
+
+@lru_cache(maxsize=None)
+def views_supported():
+    """Check once that this Pillow builds writable views with the pixel layout buffer_view() assumes.
+
+    map_buffer, Image._new and the 4-byte RGB layout are Pillow internals (last checked with
+    Pillow 12.3), so any failure or mismatch here sends merge_images back to plain Pillow.
+    """
+    if np is None:
+        return False
+    try:
+        rgb = np.zeros((2, 3, 4), dtype=np.uint8)
+        view = buffer_view(rgb, "RGB")
+        view.paste((10, 20, 30), (1, 1, 2, 2))
+        gray = np.zeros((2, 3), dtype=np.uint8)
+        gray_view = buffer_view(gray, "L")
+        gray_view.paste(40, (2, 0, 3, 1))
+        return (view.mode == "RGB" and view.size == (3, 2) and rgb[1, 1, :3].tolist() == [10, 20, 30]
+                and view.tobytes() == rgb[..., :3].tobytes() and gray[0, 2] == 40 and gray_view.tobytes() == gray.tobytes())
+    except Exception:
+        return False
+
+
+class PosterCompositor:
+    """Assemble the poster pages of one event in preallocated, reusable buffers.
+
+    Each buffer is one contiguous array as tall as the tallest page so far. The header panel
+    is written into it once when it is allocated and the banner only when the middle
+    height changes, so a page costs one copy of its own middle section however many pages
+    the event has. The poster handed to the encoder is a view of the buffer's top rows;
+    the buffer is reused once that view is released.
+    """
+
+    def __init__(self, first_image, third_image, mode, width):
+        self.first_image = first_image
+        self.third_image = third_image
+        self.mode = mode
+        self.width = width
+        self.header_height = first_image.height if first_image else 0
+        self.banner_height = third_image.height if third_image else 0
+        self.lock = threading.Lock()
+        self.free = []  # Buffers not in use: {'array', 'banner_at'}
+        self.in_use = {}  # id(view) -> buffer
+
+    @staticmethod
+    def available():
+        return views_supported()
+
+    def _allocate(self, height):
+        channels = () if self.mode == "L" else (4,)
+        buffer = {'array': np.empty((height, self.width, *channels), dtype=np.uint8), 'banner_at': None}
+        if self.first_image:
+            buffer_view(buffer['array'][:self.header_height], self.mode).paste(self.first_image, (0, 0))
+        return buffer
+
+    def compose(self, second_image):
+        """Return the merged poster for one middle panel as a view of a pooled buffer."""
+        middle_height = second_image.height
+        total_height = self.header_height + middle_height + self.banner_height
+        with self.lock:
+            buffer = self.free.pop() if self.free else None
+        if buffer is None or buffer['array'].shape[0] < total_height:
+            buffer = self._allocate(total_height)
+
+        array = buffer['array']
+        middle_view = buffer_view(array[self.header_height:self.header_height + middle_height], self.mode)
+        middle_view.paste(second_image, (0, 0))  # Converts a grayscale page straight into an RGB buffer
+        banner_at = self.header_height + middle_height
+        if self.third_image and buffer['banner_at'] != banner_at:
+            buffer_view(array[banner_at:total_height], self.mode).paste(self.third_image, (0, 0))
+            buffer['banner_at'] = banner_at
+
+        # The top rows of a C-contiguous array are contiguous themselves, so this is still a view
+        merged_image = buffer_view(array[:total_height], self.mode)
+        with self.lock:
+            self.in_use[id(merged_image)] = buffer
+        return merged_image
+
+    def release(self, merged_image):
+        # Called once the poster has been encoded; later pages may overwrite the buffer
+        with self.lock:
+            buffer = self.in_use.pop(id(merged_image), None)
+            if buffer is not None:
+                self.free.append(buffer)
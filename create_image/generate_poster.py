@@ -2,42 +2,124 @@ import json
 import requests
 from PIL import Image, ImageOps, ImageDraw, ImageFont
 from io import BytesIO
-from datetime import datetime
+from datetime import datetime, timezone
 import os
 from datetime import timedelta
+import math
 import string
+import struct
+import time
+import argparse
+import heapq
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from collections import OrderedDict, namedtuple
+from dataclasses import dataclass
+from pipeline import PosterPipeline, save_poster, check_deadline, release_after
+from output_index import OutputIndex, pixel_digest
+from panel_cache import PanelCache
+from asset_archive import AssetArchive
+from canvas_pool import CanvasPool
+from compositor import PosterCompositor
+from profiling import BatchProfiler
+from job_queue import JobQueue
+import socket
+
+# Archive that download_image records to or replays from, see use_asset_archive()
+asset_archive = None
+
+
+def use_asset_archive(archive):
+    # Route every download_image call through an AssetArchive, or back to the network with None
+    global asset_archive
+    asset_archive = archive
+    if archive and archive.mode == 'record':
+        clear_fetched_images()  # Every asset must be fetched again to end up in this archive
+
 
 # Function to download an image from a URL
 def download_image(url):
-    response = requests.get(url)
-    if response.status_code == 200:
-        return Image.open(BytesIO(response.content))
+    if asset_archive:
+        status_code, content = asset_archive.fetch(url)
+    else:
+        response = requests.get(url)
+        status_code, content = response.status_code, response.content
+    if status_code == 200:
+        return Image.open(BytesIO(content))
     else:
         raise Exception(f"Failed to download image from {url}")
 
 
+# Logos and banners repeat across matches and across days, so each image is downloaded and decoded
+# once per process and per asset archive: a replay only ever sees what its own archive holds.
+# The images are fully loaded so they can be shared safely. The least recently used ones are
+# dropped once the decoded pixels pass FETCH_CACHE_BYTES.
+FETCH_CACHE_BYTES = 128 * 1024 * 1024
+fetched_images = OrderedDict()  # (archive path or None, url) -> image
+fetched_bytes = 0
+fetched_lock = threading.Lock()
+
+
+def image_bytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+def clear_fetched_images():
+    global fetched_bytes
+    with fetched_lock:
+        fetched_images.clear()
+        fetched_bytes = 0
+
+
+def fetch_image(url):
+    global fetched_bytes
+    key = (asset_archive.path if asset_archive else None, url)
+    with fetched_lock:
+        image = fetched_images.get(key)
+        if image is not None:
+            fetched_images.move_to_end(key)
+            return image
+
+    image = download_image(url)
+    image.load()
+    with fetched_lock:
+        if key not in fetched_images:
+            fetched_images[key] = image
+            fetched_bytes += image_bytes(image)
+        while fetched_bytes > FETCH_CACHE_BYTES and len(fetched_images) > 1:
+            fetched_bytes -= image_bytes(fetched_images.popitem(last=False)[1])
+    return image
+
+
+def get_asset_archive_path(folder_path, day):
+    # The archive for a day sits next to that day's JSON file
+    return os.path.join(folder_path, f"{day}.assets.zip")
+
+
 def convert_to_12hr_format(time_obj):
     """Convert a datetime object to 12-hour time format."""
     return time_obj.strftime('%I:%M %p')  # Convert to 12-hour format with AM/PM
 
 def is_british_summer_time(date):
-    """Check if the given date is in British Summer Time."""
-    # Last Sunday in March
-    last_sunday_march = datetime(date.year, 3, 31) - timedelta(days=datetime(date.year, 3, 31).weekday() + 1)
+    """Check if the given UTC date and time is in British Summer Time."""
+    # Last Sunday in March (the 31st itself when that is a Sunday)
+    last_sunday_march = datetime(date.year, 3, 31) - timedelta(days=(datetime(date.year, 3, 31).weekday() + 1) % 7)
     # Last Sunday in October
-    last_sunday_october = datetime(date.year, 10, 31) - timedelta(days=datetime(date.year, 10, 31).weekday() + 1)
+    last_sunday_october = datetime(date.year, 10, 31) - timedelta(days=(datetime(date.year, 10, 31).weekday() + 1) % 7)
 
-    return last_sunday_march <= date <= last_sunday_october
+    # The clocks change at 01:00 UTC on both days
+    return last_sunday_march + timedelta(hours=1) <= date < last_sunday_october + timedelta(hours=1)
 
-def convert_time_zones(utc_time_str):
+def convert_time_zones(utc_time_str, event_date=None):
     try:
         # Convert string to datetime object assuming input is in UTC
         utc_time = datetime.strptime(utc_time_str, '%H:%M:%S')
 
-        # Get the current date to check for DST
-        current_date = datetime.now()
+        # Summer time follows the day of the match, which for a backfill is not today
+        current_date = datetime.combine(event_date or datetime.now(timezone.utc).date(), utc_time.time())
 
-        # Determine if the current date is in British Summer Time
+        # Determine if the kickoff is in British Summer Time
         if is_british_summer_time(current_date):
             # British Summer Time (UTC+1)
             uk_time = utc_time + timedelta(hours=1)
@@ -65,37 +147,179 @@ def custom_sort(source):
     return (2, source)
 
 
-def create_first_image(event_name, away_team_logo=None, home_team_logo=None, venue=None, date_event=None, local_time_formatted=None, utc_time_formatted=None):
-    width, height = 1024, 341  # New size for the first image
-    background = Image.new("RGB", (width, height), (255, 255, 255))  # White background
+# Fonts are loaded once per (path, size) and reused; truetype() is expensive to call in the fit loops
+@lru_cache(maxsize=None)
+def load_font(font_path, size):
+    return ImageFont.truetype(font_path, size)
 
-    # Resize logos to smaller size if they are provided
-    if away_team_logo:
-        away_team_logo = ImageOps.contain(away_team_logo, (200, 200))
-    if home_team_logo:
-        home_team_logo = ImageOps.contain(home_team_logo, (200, 200))
 
-    # Create ImageDraw object for drawing text and underline
-    draw = ImageDraw.Draw(background)
+# Blank canvases for panels and merged posters are borrowed from here and returned once used
+canvas_pool = CanvasPool()
+
+# Pages of one event are drawn, composited and encoded on this many threads. Text rendering
+# holds the GIL, but Pillow releases it while pasting, resizing and encoding.
+page_workers = os.cpu_count() or 1
+page_executor = None
+
+
+def set_page_workers(workers):
+    global page_workers, page_executor
+    if workers != page_workers and page_executor:
+        page_executor.shutdown()
+        page_executor = None
+    page_workers = workers
+
+
+def map_pages(function, *iterables):
+    # Like map(), but on the page threads; results come back in the original order
+    global page_executor
+    if page_workers <= 1:
+        return list(map(function, *iterables))
+    if page_executor is None:
+        page_executor = ThreadPoolExecutor(max_workers=page_workers, thread_name_prefix="page")
+    return list(page_executor.map(function, *iterables))
+
+
+# Posters are written as RGB PNGs. With --grayscale, a poster whose panels are all grayscale
+# (no logos and no banner) is written as an 8-bit grayscale PNG instead, a third of the size to encode.
+grayscale_posters = False
+
+# 'numpy' assembles each event's posters in reused buffers (see compositor.py) instead of a new canvas per page
+poster_compositor = 'pil'
+
+
+def set_grayscale_posters(enabled):
+    global grayscale_posters
+    grayscale_posters = enabled
+
+
+def set_compositor(name):
+    global poster_compositor
+    if name == 'numpy' and not PosterCompositor.available():
+        print("numpy isn't installed or this Pillow can't share its pixels with numpy, compositing posters with Pillow")
+        name = 'pil'
+    poster_compositor = name
+
+
+# Shared 1px image used only for measuring text, so layout never needs a real canvas
+_measure_draw = ImageDraw.Draw(Image.new("RGB", (1024, 1), (255, 255, 255)))
+
+
+# Measurements are memoized: glyph loading for the Gagalin font costs ~0.15ms per character
+@lru_cache(maxsize=65536)
+def text_bbox(text, font):
+    return _measure_draw.textbbox((0, 0), text, font=font)
+
+
+@lru_cache(maxsize=None)
+def has_kern_table(font_path):
+    # Read the font's table directory; Pillow's basic layout kerns only with the old 'kern' table
+    with open(font_path, 'rb') as file:
+        header = file.read(12)
+        tables = struct.unpack('>H', header[4:6])[0]
+        directory = file.read(16 * tables)
+    return any(directory[16 * i:16 * i + 4] == b'kern' for i in range(tables))
+
+
+@lru_cache(maxsize=4096)
+def glyph_metrics(char, font):
+    # Advance (in 1/64px steps) and ink box of one glyph drawn at the origin
+    return font.getlength(char), text_bbox(char, font)
+
+
+@lru_cache(maxsize=65536)
+def kerning(pair, font):
+    return font.getlength(pair) - glyph_metrics(pair[0], font)[0] - glyph_metrics(pair[1], font)[0]
+
+
+def text_width(text, font):
+    # Measuring a new string in Gagalin costs ~6ms, and every event name is new. Pillow's basic layout
+    # puts each glyph's ink box at its pen position rounded to the nearest pixel, so the width is
+    # put together from cached per-glyph and per-pair measurements instead; it matches textbbox().
+    if getattr(font, 'layout_engine', None) != ImageFont.Layout.BASIC or not isinstance(getattr(font, 'path', None), str):
+        return text_bbox(text, font)[2]  # raqm shapes text, so only a full measurement is exact
+    kerned = has_kern_table(font.path)
+    pen = right = 0
+    previous = None
+    for char in text:
+        if kerned and previous is not None:
+            pen += kerning(previous + char, font)
+        advance, bbox = glyph_metrics(char, font)
+        if bbox[2] > bbox[0]:  # Spaces have no ink
+            right = max(right, math.floor(pen + 0.5) + bbox[2])
+        pen += advance
+        previous = char
+    return right
+
+
+def layout_first_image(event_name, venue=None):
+    """Fit the header and venue fonts for the first image without drawing anything."""
+    width, height = 1024, 341  # New size for the first image
+    layout = {'width': width, 'height': height, 'header_font_size': None, 'venue_font_size': None, 'header_overflow': False}
 
     # Load the Gagalin font (.otf) and adjust font size dynamically for the header to fit the width
+    font_path = "Gagalin.otf"
     try:
-        font_path = "Gagalin.otf"
         max_font_size = 100  # Starting font size to try
         min_font_size = 20  # Minimum font size if the text is too wide
-        font = ImageFont.truetype(font_path, max_font_size)
-        
-        while draw.textbbox((0, 0), event_name, font=font)[2] > width - 40 and max_font_size > min_font_size:
+        font = load_font(font_path, max_font_size)
+
+        # Text width scales roughly linearly with the font size, so skip the sizes that are
+        # clearly too wide (5% slack covers hinting) before stepping down 5px at a time
+        full_width = text_width(event_name, font)
+        if full_width > width - 40:
+            estimated_size = max_font_size * (width - 40) * 1.05 / full_width
+            while max_font_size - 5 > estimated_size and max_font_size > min_font_size:
+                max_font_size -= 5
+            font = load_font(font_path, max_font_size)
+
+        while text_width(event_name, font) > width - 40 and max_font_size > min_font_size:
             max_font_size -= 5  # Reduce font size gradually
-            font = ImageFont.truetype(font_path, max_font_size)
-        
-        sub_font = ImageFont.truetype(font_path, 40)  # Smaller font size for local time and UTC
+            font = load_font(font_path, max_font_size)
+
+        sub_font = load_font(font_path, 40)  # Smaller font size for local time and UTC
+        layout['header_font_size'] = max_font_size
+        layout['header_overflow'] = text_width(event_name, font) > width - 40
     except IOError:
         font = ImageFont.load_default()  # Fallback to default font if the custom font is not available
         sub_font = ImageFont.load_default()  # Fallback for smaller text
 
+    # Dynamically adjust venue text size to fit
+    max_venue_font_size = 40
+    venue_font = load_font(font_path, max_venue_font_size) if venue else None
+
+    # Define a safe area for the text to avoid overlapping with logos
+    safe_margin = 260  # The space taken by the logos + some padding
+    safe_width = width - 2 * safe_margin  # Reduced width to fit within the logos
+    if venue:
+        while text_width(f"Venue: {venue}", venue_font) > safe_width and max_venue_font_size > 20:
+            max_venue_font_size -= 2
+            venue_font = load_font(font_path, max_venue_font_size)
+        layout['venue_font_size'] = max_venue_font_size
+
+    layout.update(font=font, sub_font=sub_font, venue_font=venue_font)
+    return layout
+
+
+def create_first_image(event_name, away_team_logo=None, home_team_logo=None, venue=None, date_event=None, local_time_formatted=None, utc_time_formatted=None):
+    layout = layout_first_image(event_name, venue)
+    width, height = layout['width'], layout['height']
+    font, sub_font, venue_font = layout['font'], layout['sub_font'], layout['venue_font']
+    # The text is black on white, so draw it on an 8-bit grayscale canvas (a third of the memory of RGB)
+    # and only switch to RGB when there are colour logos to paste
+    background = canvas_pool.acquire("L", (width, height), 255)  # White background
+
+    # Resize logos to smaller size if they are provided
+    if away_team_logo:
+        away_team_logo = ImageOps.contain(away_team_logo, (200, 200))
+    if home_team_logo:
+        home_team_logo = ImageOps.contain(home_team_logo, (200, 200))
+
+    # Create ImageDraw object for drawing text and underline
+    draw = ImageDraw.Draw(background)
+
     # Calculate text size and position for the header at the top
-    header_bbox = draw.textbbox((0, 0), event_name, font=font)
+    header_bbox = text_bbox(event_name, font)
     header_width = header_bbox[2] - header_bbox[0]
     header_position = ((width - header_width) // 2, 10)  # Set y-position for the header
 
@@ -107,18 +331,6 @@ def create_first_image(event_name, away_team_logo=None, home_team_logo=None, ven
     underline_end = (header_position[0] + header_width, header_position[1] + header_bbox[3] + 5)  # Same y, full width
     draw.line([underline_start, underline_end], fill="black", width=5)  # Thickness of the underline
 
-    # Dynamically adjust venue text size to fit
-    max_venue_font_size = 40
-    venue_font = ImageFont.truetype(font_path, max_venue_font_size) if venue else None
-
-    # Define a safe area for the text to avoid overlapping with logos
-    safe_margin = 260  # The space taken by the logos + some padding
-    safe_width = width - 2 * safe_margin  # Reduced width to fit within the logos
-    if venue:
-        while draw.textbbox((0, 0), f"Venue: {venue}", font=venue_font)[2] > safe_width and max_venue_font_size > 20:
-            max_venue_font_size -= 2
-            venue_font = ImageFont.truetype(font_path, max_venue_font_size)
-
     # Calculate positions for venue, date_event, local time, and UTC time with equal spacing
     vertical_start = 150  # Start further down
     line_spacing = 50  # Equal spacing between each line
@@ -160,6 +372,10 @@ def create_first_image(event_name, away_team_logo=None, home_team_logo=None, ven
 
     # Paste the logos closer to the edges, now move them to the bottom if provided
     logo_y_position = height - 210  # Position logos 10 pixels from the bottom
+    if away_team_logo or home_team_logo:
+        grayscale = background
+        background = grayscale.convert("RGB")
+        canvas_pool.release(grayscale)
     
     if away_team_logo:
         if away_team_logo.mode in ('RGBA', 'LA'):
@@ -173,87 +389,153 @@ def create_first_image(event_name, away_team_logo=None, home_team_logo=None, ven
         else:
             background.paste(home_team_logo, (width - 210, logo_y_position))  # No mask needed
 
-    # Save the resulting image
-    background.save(f"{event_name}_first.png")
+    return background
+
+
+def wrap_text(text, font, max_width):
+    # Most sources fit on one line, and no prefix of a line is wider than the line itself
+    if text_width(text, font) <= max_width:
+        return [text]
+
+    lines = []
+    words = text.split(' ')
+    current_line = []
+    for word in words:
+        current_line.append(word)
+        line_text = ' '.join(current_line)
+        if text_width(line_text, font) > max_width:
+            current_line.pop()  # Remove the last word and add the line
+            lines.append(' '.join(current_line))
+            current_line = [word]  # Start a new line with the last word
+    lines.append(' '.join(current_line))  # Add the last line
+    return lines
+
+
+def add_spaces(sources):
+    # Add spaces between country and channel name for formatting
+    formatted_sources = []
+    for source in sources:
+        if ':' in source:
+            country, channel = source.split(':', 1)
+            formatted_source = f"{country}:  {channel.strip()}"
+            formatted_sources.append(formatted_source)
+        else:
+            formatted_sources.append(source)
+    return formatted_sources
+
+
+def paginate(sources, max_per_page):
+    # Calculate the number of images needed
+    num_images = -(-len(sources) // max_per_page)  # Ceiling division
+
+    # Calculate how many sources per image (equally distributed)
+    sources_per_image = len(sources) // num_images
+    extra_sources = len(sources) % num_images  # Sources that couldn't be divided equally
 
+    chunks = []
+    current_index = 0
+    for i in range(num_images):
+        # Calculate the number of sources for this image
+        num_sources_this_image = sources_per_image + (1 if i < extra_sources else 0)
 
-def create_second_image(event_name, sources):
+        # Get the chunk of sources for the current image
+        chunks.append(sources[current_index:current_index + num_sources_this_image])
+        current_index += num_sources_this_image
+    return chunks
+
+
+def layout_second_image(sources, columns=1):
+    """Sort and paginate the sources and measure the height of every page without drawing anything.
+
+    With columns='auto', the sources may also flow into two or three columns per page, top to
+    bottom and then left to right so the custom_sort order is kept. Columns use a smaller font,
+    are sized to their widest entry and fill the same text height as a single-column page. The
+    layout with the fewest pages (then the least height) is picked among those where every
+    entry fits on a single line.
+    """
     # Constants
     width = 1024  # Fixed width
     min_height = 341  # Minimum height
     default_line_height = 50  # Default line height
     max_sources_per_image = 10  # Max number of sources per image, used to calculate number of images
+    column_gap = 40  # Space between columns
+    column_font_sizes = {2: (32, 30, 28), 3: (24, 22)}  # Largest size that fits wins
 
-    def wrap_text(text, font, max_width, draw):
-        lines = []
-        words = text.split(' ')
-        current_line = []
-        for word in words:
-            current_line.append(word)
-            line_text = ' '.join(current_line)
-            if draw.textbbox((0, 0), line_text, font=font)[2] > max_width:
-                current_line.pop()  # Remove the last word and add the line
-                lines.append(' '.join(current_line))
-                current_line = [word]  # Start a new line with the last word
-        lines.append(' '.join(current_line))  # Add the last line
-        return lines
-
-    def add_spaces(sources):
-        # Add spaces between country and channel name for formatting
-        formatted_sources = []
-        for source in sources:
-            if ':' in source:
-                country, channel = source.split(':', 1)
-                formatted_source = f"{country}:  {channel.strip()}"
-                formatted_sources.append(formatted_source)
-            else:
-                formatted_sources.append(source)
-        return formatted_sources
-
-    def calculate_image_height(sources, font, draw):
+    def calculate_image_height(sources, font):
         # Measure total height required for all sources
         total_height = 0
         for source in sources:
-            wrapped_lines = wrap_text(source.strip(), font, width - 40, draw)
+            wrapped_lines = wrap_text(source.strip(), font, width - 40)
             total_height += default_line_height * len(wrapped_lines)  # Account for each wrapped line
         return max(min_height, total_height + 40)  # Add padding and ensure height is at least the minimum
 
+    def layout_columns(sources, num_columns, font, line_height):
+        # Pages of num_columns columns as tall as a full single-column page, or None if a page is too wide
+        max_rows = max_sources_per_image * default_line_height // line_height
+        pages = []
+        for chunk_sources in paginate(sources, max_rows * num_columns):
+            rows = -(-len(chunk_sources) // num_columns)
+            page_columns = [chunk_sources[j:j + rows] for j in range(0, len(chunk_sources), rows)]
+            column_widths = [max(text_width(source.strip(), font) for source in column) for column in page_columns]
+            if sum(column_widths) + column_gap * (len(page_columns) - 1) > width - 40:
+                return None
+            height = max(min_height, rows * line_height + 40)
+            pages.append({'sources': chunk_sources, 'height': height, 'columns': page_columns, 'column_widths': column_widths,
+                          'font': font, 'line_height': line_height})
+        return pages
+
     # Format sources with spaces
-    sources.sort(key=custom_sort)
-    sources = add_spaces(sources)
+    sources = add_spaces(sorted(sources, key=custom_sort))
 
     # Load a font (adjust size dynamically based on the number of sources)
     try:
-        font = ImageFont.truetype("OpenSans-Bold.otf", 40)  # Use a smaller font size for pagination
+        font = load_font("OpenSans-Bold.otf", 40)  # Use a smaller font size for pagination
     except IOError:
         font = ImageFont.load_default()  # Fallback to default font if the custom font is not available
 
-    # Create a dummy image to initialize the draw object
-    dummy_image = Image.new("RGB", (width, 1), (255, 255, 255))
-    draw = ImageDraw.Draw(dummy_image)
+    # Single column layout, long sources wrap
+    pages = []
+    for chunk_sources in paginate(sources, max_sources_per_image):
+        height = calculate_image_height(chunk_sources, font)
+        pages.append({'sources': chunk_sources, 'height': height, 'columns': None, 'column_widths': None,
+                      'font': font, 'line_height': default_line_height})
 
-    # Calculate the number of images needed
-    num_images = -(-len(sources) // max_sources_per_image)  # Ceiling division
+    if columns == 'auto' and len(sources) > 1 and isinstance(font, ImageFont.FreeTypeFont):
+        for num_columns, font_sizes in column_font_sizes.items():
+            for font_size in font_sizes:
+                candidate = layout_columns(sources, num_columns, load_font(font.path, font_size), round(font_size * 1.25))
+                if candidate is None:
+                    continue
+                if (len(candidate), sum(page['height'] for page in candidate)) < (len(pages), sum(page['height'] for page in pages)):
+                    pages = candidate
+                break
 
-    # Calculate how many sources per image (equally distributed)
-    sources_per_image = len(sources) // num_images
-    extra_sources = len(sources) % num_images  # Sources that couldn't be divided equally
+    return {'width': width, 'line_height': default_line_height, 'column_gap': column_gap, 'font': font, 'pages': pages}
 
-    # Loop over each image
-    current_index = 0
-    for i in range(num_images):
-        # Calculate the number of sources for this image
-        num_sources_this_image = sources_per_image + (1 if i < extra_sources else 0)
 
-        # Get the chunk of sources for the current image
-        chunk_sources = sources[current_index:current_index + num_sources_this_image]
-        current_index += num_sources_this_image
+def create_second_image(event_name, sources, columns=1):
+    layout = layout_second_image(sources, columns)
+    width, default_line_height, font = layout['width'], layout['line_height'], layout['font']
 
-        # Create a blank image with the appropriate height
-        height = calculate_image_height(chunk_sources, font, draw)
-        background = Image.new("RGB", (width, height), (255, 255, 255))  # White background
+    def render_page(page):
+        chunk_sources, height = page['sources'], page['height']
+
+        # Create a blank grayscale image with the appropriate height, text pages never need colour
+        background = canvas_pool.acquire("L", (width, height), 255)  # White background
         draw = ImageDraw.Draw(background)
 
+        if page['columns']:
+            # Centre the block of columns, each column left-aligned and as wide as its widest source
+            rows = len(page['columns'][0])
+            x_position = (width - sum(page['column_widths']) - layout['column_gap'] * (len(page['columns']) - 1)) // 2
+            for column, column_width in zip(page['columns'], page['column_widths']):
+                vertical_position = (height - rows * page['line_height']) // 2
+                for source in column:
+                    draw.text((x_position, vertical_position), source.strip(), font=page['font'], fill="black")
+                    vertical_position += page['line_height']
+                x_position += column_width + layout['column_gap']
+            return background
+
         # Calculate total height of all text lines
         total_text_height = 0
         for source in chunk_sources:
@@ -264,7 +546,7 @@ def create_second_image(event_name, sources):
 
         for source in chunk_sources:
             # Treat the entire line (country + channel) as a single block
-            line_bbox = draw.textbbox((0, 0), source.strip(), font=font)
+            line_bbox = text_bbox(source.strip(), font)
             line_width = line_bbox[2] - line_bbox[0]
 
             # Center-align the entire line (country + channel)
@@ -272,14 +554,15 @@ def create_second_image(event_name, sources):
 
             vertical_position += default_line_height  # Move to the next line
 
-        # Save the resulting image
-        save_path = f"{event_name}_second_{i + 1}.png"
-        background.save(save_path)
+        return background
+
+    # Every page is laid out already, so they can be drawn concurrently; the order is kept
+    return map_pages(render_page, layout['pages'])
 
 
 def create_third_image(event_name, league_banner_url):
     # Download the banner image
-    banner_image = download_image(league_banner_url)
+    banner_image = fetch_image(league_banner_url)
 
     # Resize the banner to fit the width of the final image while maintaining aspect ratio
     banner_width = 1024  # Width of the merged images
@@ -288,58 +571,78 @@ def create_third_image(event_name, league_banner_url):
 
     # Create a white background for the third image (banner area)
     width, height = 1024, banner_height  # Adjust height based on banner size
-    background = Image.new("RGB", (width, height), (255, 255, 255))  # White background
+    background = canvas_pool.acquire("RGB", (width, height), (255, 255, 255))  # White background
 
     # Paste the banner in the center of the third image
     background.paste(banner_image, (0, 0))  # Banner image now fills the entire width
 
-    # Save the third image as event_name_third.png
-    background.save(f"{event_name}_third.png")
+    return background
 
 
-def merge_images(event_name, sport, league):
-    # File paths for images
-    first_image_path = f"{event_name}_first.png"
-    third_image_path = f"{event_name}_third.png"
+# An output size for every poster page. width=None keeps the full merged size; the full
+# rendition keeps the plain "_poster_N.png" name, the others get a "_<name>" suffix.
+Rendition = namedtuple('Rendition', ['name', 'width'])
+FULL_RENDITION = Rendition('full', None)
+POSTER_WIDTH = 1024  # Width of every panel, and so of the merged poster
 
-    # Get today's date using the existing get_today_date function
-    today_date = get_today_date()
+
+def parse_renditions(spec):
+    """Parse "social:600,thumb:256" into Rendition tuples, always including the full size."""
+    renditions = [FULL_RENDITION]
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        name, _, width = item.strip().partition(':')
+        if not name or not width.isdigit() or int(width) <= 0:
+            raise argparse.ArgumentTypeError(f"Invalid rendition '{item}', expected name:width")
+        if int(width) >= POSTER_WIDTH:
+            # It would only be a second copy of the full poster under another name
+            raise argparse.ArgumentTypeError(f"Rendition '{item}' should be narrower than the {POSTER_WIDTH}px poster")
+        renditions.append(Rendition(name, int(width)))
+    return renditions
+
+
+def derive_renditions(merged_image, renditions):
+    """Yield (rendition, image) pairs, scaling each size down from the next larger one instead of the full image."""
+    current = merged_image
+    for rendition in sorted(renditions, key=lambda r: -(r.width or merged_image.width)):
+        if rendition.width and rendition.width >= merged_image.width:
+            continue  # Not a smaller size, the full rendition already covers it
+        if rendition.width and rendition.width < current.width:
+            height = max(1, round(current.height * rendition.width / current.width))
+            current = current.resize((rendition.width, height), Image.LANCZOS)
+        yield rendition, current
+
+
+def merge_images(event_name, sport, league, first_image, second_images, third_image, pipeline=None, index=None, renditions=None, deadline=None, output_date=None):
+    # Get today's date using the existing get_today_date function, unless the posters belong to another day
+    today_date = output_date or get_today_date()
 
     # Create directory structure 'date/sport/league'
     save_dir = os.path.join(today_date, sport, league)
     os.makedirs(save_dir, exist_ok=True)  # Create directories if they don't exist
 
-    # Check if the first image exists
-    if os.path.isfile(first_image_path):
-        first_image = Image.open(first_image_path)
-    else:
-        print(f"First image not found: {first_image_path}")
-        first_image = None
-
-    # Check if the third image exists
-    if os.path.isfile(third_image_path):
-        third_image = Image.open(third_image_path)
-    else:
-        print(f"Third image not found: {third_image_path}")
-        third_image = None
+    if first_image is None:
+        print(f"First image not found for event: {event_name}")
+    if third_image is None:
+        print(f"Third image not found for event: {event_name}")
 
-    # List all second images
-    second_image_files = [f for f in os.listdir() if f.startswith(f"{event_name}_second_") and f.endswith(".png")]
-    
-    if not second_image_files:
+    if not second_images:
         print(f"No second images found for event: {event_name}")
-        return
+        return 0
 
-    second_image_files.sort()  # Optional: sort files if needed
+    # With the numpy compositor the header and banner are written once per output buffer rather than once per page.
+    # It needs every panel to be the same width, which they are unless a panel failed to render at full size.
+    compositor = None
+    panels = [image for image in (first_image, *second_images, third_image) if image]
+    if poster_compositor == 'numpy' and len({image.width for image in panels}) == 1:
+        mode = "L" if grayscale_posters and all(image.mode == "L" for image in panels) else "RGB"
+        compositor = PosterCompositor(first_image, third_image, mode, panels[0].width)
 
     # Process each second image
-    for idx, second_image_file in enumerate(second_image_files):
-        second_image_path = os.path.join(os.getcwd(), second_image_file)
-        if not os.path.isfile(second_image_path):
-            print(f"Second image file not found: {second_image_path}")
-            continue
-
-        second_image = Image.open(second_image_path)
+    def merge_page(idx, second_image):
+        if compositor:
+            return save_renditions(idx, compositor.compose(second_image), compositor.release)
 
         # Determine total height based on available images
         total_height = 0
@@ -357,8 +660,11 @@ def merge_images(event_name, sport, league):
         if third_image:
             width = max(width, third_image.width)
         
-        # Create a new blank image to hold the merged result
-        merged_image = Image.new("RGB", (width, total_height))
+        # Create a new blank image to hold the merged result. Grayscale panels are converted to RGB
+        # only while pasting; with --grayscale a poster whose panels are all grayscale stays grayscale.
+        panels = [image for image in (first_image, second_image, third_image) if image]
+        mode = "L" if grayscale_posters and all(image.mode == "L" for image in panels) else "RGB"
+        merged_image = canvas_pool.acquire(mode, (width, total_height))
 
         current_height = 0
         
@@ -375,19 +681,34 @@ def merge_images(event_name, sport, league):
         if third_image:
             merged_image.paste(third_image, (0, current_height))
 
-        # Save the merged image in the created directory
-        save_path = os.path.join(save_dir, f"{event_name}_poster_{idx + 1}.png")
-        merged_image.save(save_path)
-        print(f"Saved merged image to {save_path}")
-
-        # Clean up the individual second image
-        os.remove(second_image_path)
+        return save_renditions(idx, merged_image, canvas_pool.release)
+
+    def save_renditions(idx, merged_image, release):
+        # Derive every requested size from the in-memory merged image, then hand each one to the
+        # encode/write stages (encoded concurrently there), or save it here when running without a pipeline.
+        # Either way a page identical to an indexed poster is hardlinked instead of encoded again.
+        # All renditions are derived before any is submitted, and the merged image is released (and reused)
+        # exactly once, after the last of them has been encoded. Returns how many were saved late here;
+        # the pipeline counts its own.
+        late = 0
+        derived = list(derive_renditions(merged_image, renditions or [FULL_RENDITION]))
+        release_page = release_after(len(derived), release, merged_image)
+        for rendition, image in derived:
+            suffix = "" if rendition.width is None else f"_{rendition.name}"
+            save_path = os.path.join(save_dir, f"{event_name}_poster_{idx + 1}{suffix}.png")
+            if pipeline:
+                pipeline.submit(save_path, image, deadline, release_page)
+            else:
+                save_poster(save_path, image, index)
+                print(f"Saved merged image to {save_path}")
+                late += check_deadline(save_path, deadline)
+        if not pipeline:
+            release(merged_image)
+        return late
 
-    # Clean up the first and third images if needed
-    if first_image:
-        os.remove(first_image_path)
-    if third_image:
-        os.remove(third_image_path)
+    # Pages are composited and encoded concurrently; the _poster_N numbering follows the page order.
+    # Returns the number of pages saved after their deadline when there is no pipeline.
+    return sum(map_pages(merge_page, range(len(second_images)), second_images))
 
 
 # Function to get today's date in YYYY-MM-DD format
@@ -396,8 +717,8 @@ def get_today_date():
 
 
 # Function to check if the file exists in the folder
-def get_file_path(folder_path):
-    today_date = get_today_date()
+def get_file_path(folder_path, day=None):
+    today_date = day or get_today_date()
     file_name = f"{today_date}.json"
     file_path = os.path.join(folder_path, file_name)
     
@@ -410,8 +731,8 @@ def get_file_path(folder_path):
 
 
 # Main function to get match information
-def get_match_information(folder_path):
-    file_path = get_file_path(folder_path)
+def get_match_information(folder_path, day=None):
+    file_path = get_file_path(folder_path, day)
     
     if file_path:
         with open(file_path, 'r') as file:
@@ -431,77 +752,487 @@ def get_match_information(folder_path):
         return None
 
 
-def main():
+def parse_sources(sources):
+    # Split the comma separated "Country:Channel" string into a list of sources
+    if not sources:
+        return ['No sources found for this event']
+    sources = sources.replace(' ,', ',').replace(' , ', ',').replace(': ', ':')  # Clean up spaces
+    return [source.strip() for source in sources.split(",")]  # Strip leading/trailing spaces after split
+
+
+# Every match must carry these keys; the values may be null unless listed in REQUIRED_VALUES
+MATCH_KEYS = ('strHomeTeamBadge', 'strAwayTeamBadge', 'Venue', 'UTC', 'dateEvent', 'Sources', 'league_banner', 'strLeague')
+REQUIRED_VALUES = ('dateEvent',)  # A null UTC means the kickoff time isn't announced yet
+
+
+@dataclass
+class MatchRecord:
+    """A validated match with every field normalized for rendering."""
+    sport: str
+    match_name: str
+    event_name: str  # Sanitized for use in file names
+    home_team_logo_url: str | None
+    away_team_logo_url: str | None
+    venue: str | None
+    date_event: str  # Display form, YYYY/MM/DD
+    kickoff: datetime | None  # Timezone-aware UTC kickoff, None while the time is still to be announced
+    utc_time_formatted: str | None
+    uk_time_formatted: str | None
+    sources: list
+    league_banner_url: str | None
+    league_name: str
+
+
+def sanitize_event_name(match_name):
+    # Use match name directly, remove trailing colon if present
+    event_name = match_name.rstrip(':')
+
+    # Define the invalid characters (e.g., /, \, :, *, ?, ", <, >, |)
+    invalid_chars = '/\\:*?"<>|'
+
+    # Create a translation map that replaces each invalid character with a dash (-)
+    replacement_map = str.maketrans(invalid_chars, '-' * len(invalid_chars))
+
+    # Sanitize the event_name by replacing invalid characters
+    return event_name.translate(replacement_map)
+
+
+def validate_match(sport, match_name, match_info):
+    """Return (MatchRecord, None) for a usable match, or (None, reasons) explaining why it was rejected."""
+    if not isinstance(match_info, dict):
+        return None, [f"match details should be an object, got {type(match_info).__name__}"]
+
+    reasons = []
+    for key in MATCH_KEYS:
+        if key not in match_info:
+            reasons.append(f"missing '{key}'")
+        elif match_info[key] is None and key in REQUIRED_VALUES:
+            reasons.append(f"'{key}' is null")
+        elif match_info[key] is not None and not isinstance(match_info[key], str):
+            reasons.append(f"'{key}' should be a string, got {type(match_info[key]).__name__}")
+
+    event_name = sanitize_event_name(match_name)  # Kept as is, spaces included, so file names match earlier runs
+    if not event_name.strip():
+        reasons.append("empty event name")
+    if reasons:
+        return None, reasons
+
+    try:
+        datetime.strptime(match_info['dateEvent'], '%Y-%m-%d')
+    except ValueError:
+        return None, [f"can't parse dateEvent '{match_info['dateEvent']}'"]
+    try:
+        kickoff = datetime.strptime(f"{match_info['dateEvent']} {match_info['UTC'] or ''}", '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    except ValueError:
+        kickoff = None  # e.g. an empty UTC for a time not announced yet; the poster is made without the time lines
+    utc_time_formatted, uk_time_formatted = convert_time_zones(match_info['UTC'] or '', kickoff.date() if kickoff else None)
+
+    record = MatchRecord(
+        sport=sport,
+        match_name=match_name,
+        event_name=event_name,
+        home_team_logo_url=match_info['strHomeTeamBadge'] or None,
+        away_team_logo_url=match_info['strAwayTeamBadge'] or None,
+        venue=match_info['Venue'],
+        date_event=match_info['dateEvent'].replace('-', '/'),
+        kickoff=kickoff,
+        utc_time_formatted=utc_time_formatted,
+        uk_time_formatted=uk_time_formatted,
+        sources=parse_sources(match_info['Sources']),
+        league_banner_url=match_info['league_banner'] or None,
+        league_name=match_info['strLeague'] if match_info['strLeague'] is not None else 'No_league',
+    )
+    return record, None
+
+
+def validate_matches(sports_matches):
+    """Preflight over the whole day's file: split it into MatchRecords and rejected (sport, match, reasons)."""
+    records, rejected = [], []
+    for sport, matches in sports_matches.items():
+        if not isinstance(matches, list):
+            rejected.append((sport, None, [f"matches for {sport} should be a list, got {type(matches).__name__}"]))
+            continue
+        for match_data in matches:
+            if not isinstance(match_data, dict):
+                rejected.append((sport, None, [f"match entry should be an object, got {type(match_data).__name__}"]))
+                continue
+            for match_name, match_info in match_data.items():  # Use the match name as key
+                record, reasons = validate_match(sport, match_name, match_info)
+                if record:
+                    records.append(record)
+                else:
+                    rejected.append((sport, match_name, reasons))
+    return records, rejected
+
+
+def dry_run(records, columns=1):
+    """Print the page count, sizes and chosen font sizes of every poster without downloading or rendering."""
+    start = time.perf_counter()
+    events = 0
+    for record in records:
+        try:
+            first = layout_first_image(record.event_name, record.venue)
+            second = layout_second_image(record.sources, columns)
+        except Exception as err:
+            print(f"[{record.sport}] {record.event_name}: layout failed ({err})")
+            continue
+
+        events += 1
+        header = f"header {first['header_font_size']}px"
+        if first['header_overflow']:
+            header += " (min size, still overflows)"
+        elif first['header_font_size'] == 20:
+            header += " (min size)"
+        venue = f", venue {first['venue_font_size']}px" if first['venue_font_size'] else ""
+        banner = " + banner" if record.league_banner_url else ""
+        heights = f"[{', '.join(str(page['height']) for page in second['pages'])}]"
+        if second['pages'][0]['columns']:
+            heights += f" in {len(second['pages'][0]['columns'])} columns at {second['pages'][0]['font'].size}px"
+        print(f"[{record.sport}] {record.event_name}: {len(second['pages'])} page(s), {header}{venue}")
+        print(f"    first {first['width']}x{first['height']}, second heights {heights}{banner}")
+    print(f"Dry run: {events} event(s) laid out in {time.perf_counter() - start:.3f}s")
+
+
+def schedule_matches(records, now=None, within_hours=None):
+    """Yield records from a priority queue ordered by kickoff, so imminent events render first.
+
+    Events that have already kicked off come after every upcoming one, and events with no
+    kickoff time yet come last. With within_hours, only events kicking off between now and
+    now + within_hours are scheduled, plus those with no kickoff time since they may be.
+    """
+    now = now or datetime.now(timezone.utc)
+    queue = []
+    for position, record in enumerate(records):
+        if record.kickoff is None:
+            heapq.heappush(queue, (2, now, position, record))
+            continue
+        if within_hours is not None and not now <= record.kickoff <= now + timedelta(hours=within_hours):
+            continue
+        # The JSON position breaks ties so equal kickoffs keep the file order
+        heapq.heappush(queue, (int(record.kickoff < now), record.kickoff, position, record))
+    while queue:
+        yield heapq.heappop(queue)[-1]
+
+
+# Bump when the look of any panel changes, so cached panels from the old templates are not reused
+PANEL_CACHE_VERSION = 1
+
+
+def render_match(record, pipeline=None, index=None, renditions=None, deadline=None, output_date=None, panel_cache=None, columns=1):
+    # Download the logos and render, merge and save every poster page for one match
+    home_team_logo = fetch_image(record.home_team_logo_url) if record.home_team_logo_url else None
+    away_team_logo = fetch_image(record.away_team_logo_url) if record.away_team_logo_url else None
+
+    def render_first():
+        return [create_first_image(record.event_name, away_team_logo, home_team_logo, record.venue, record.date_event, record.uk_time_formatted, record.utc_time_formatted)]
+
+    def render_second():
+        return create_second_image(record.event_name, record.sources, columns)
+
+    def render_third():
+        return [create_third_image(record.event_name, record.league_banner_url)]
+
+    if panel_cache is None:
+        first_image = render_first()[0]
+        second_images = render_second()
+        third_image = create_third_image(record.event_name, record.league_banner_url) if record.league_banner_url else None
+    else:
+        # Each panel is keyed only by what it depends on, so e.g. a change to Sources re-renders
+        # just the broadcaster pages, and a cached banner is not even downloaded again
+        logo_hashes = [pixel_digest(logo) if logo else None for logo in (home_team_logo, away_team_logo)]
+        first_key = PanelCache.key('first', PANEL_CACHE_VERSION, record.event_name, record.venue, record.date_event,
+                                   record.uk_time_formatted, record.utc_time_formatted, logo_hashes)
+        first_image = panel_cache.get_or_render('first', first_key, render_first)[0]
+
+        second_key = PanelCache.key('second', PANEL_CACHE_VERSION, sorted(record.sources, key=custom_sort), columns)
+        second_images = panel_cache.get_or_render('second', second_key, render_second)
+
+        third_image = None
+        if record.league_banner_url:
+            third_key = PanelCache.key('third', PANEL_CACHE_VERSION, record.league_banner_url, 1024)
+            third_image = panel_cache.get_or_render('third', third_key, render_third)[0]
+
+    late = merge_images(record.event_name, record.sport, record.league_name, first_image, second_images, third_image, pipeline, index, renditions, deadline, output_date)
+
+    # The panels have been pasted into every page, so their canvases can be reused
+    for panel in [first_image, third_image, *second_images]:
+        canvas_pool.release(panel)
+    return late
+
+
+def run_worker(db_path, worker_id, lease_seconds=300, max_attempts=3, poll_seconds=5, index=None, renditions=None, panel_cache=None, replay_assets_from=None,
+               columns=1):
+    """Claim and render matches from the shared job queue until none are pending or running.
+
+    Posters are saved before a job is marked done, so a finished job always has its files
+    on disk; parallelism comes from running several workers. With replay_assets_from set
+    to a folder, every asset is served from that folder's <day>.assets.zip archives.
+    """
+    queue = JobQueue(db_path)
+    archives = {}
+    rendered = failed = 0
+    try:
+        while True:
+            job = queue.claim(worker_id, lease_seconds, max_attempts)
+            if job is None:
+                counts, _ = queue.progress()
+                if counts['pending'] == 0 and counts['running'] == 0:
+                    break
+                time.sleep(poll_seconds)  # Other workers hold leases that may still expire
+                continue
+
+            record, reasons = validate_match(job['sport'], job['match_name'], job['payload'])
+            try:
+                if record is None:
+                    raise ValueError('; '.join(reasons))
+                if replay_assets_from is not None:
+                    if job['day'] not in archives:
+                        archives[job['day']] = AssetArchive(get_asset_archive_path(replay_assets_from, job['day']), 'replay')
+                    use_asset_archive(archives[job['day']])
+                render_match(record, None, index, renditions, output_date=job['day'], panel_cache=panel_cache, columns=columns)
+            except Exception as err:
+                print(f"Couldn't generate poster for {job['match_name']}")
+                print(err)
+                queue.fail(job['id'], worker_id, str(err) or type(err).__name__)
+                failed += 1
+            else:
+                if not queue.complete(job['id'], worker_id):
+                    print(f"Lease on {job['match_name']} expired before it finished; another worker owns it now")
+                rendered += 1
+    finally:
+        queue.close()
+        use_asset_archive(None)
+        for archive in archives.values():
+            archive.close()
+    print(f"Worker {worker_id}: {rendered} match(es) rendered, {failed} failed")
+
+
+def print_queue_status(db_path):
+    queue = JobQueue(db_path)
+    try:
+        counts, failed = queue.progress()
+    finally:
+        queue.close()
+    print(", ".join(f"{count} {status}" for status, count in counts.items()))
+    for job in failed:
+        print(f"Failed [{job['day']}] {job['sport']} {job['match_name']} after {job['attempts']} attempt(s): {job['error']}")
+
+
+def run_day(folder_path, day, args, sports_matches, backfill=False):
+    """Validate, schedule and render every match of one day's file into day/sport/league.
+
+    In a backfill the kickoffs are in the past, so no deadlines are checked and --within-hours is ignored.
+    """
+    # Validate every match up front so bad data never costs a download or a render
+    records, rejected = validate_matches(sports_matches)
+    for sport, match_name, reasons in rejected:
+        print(f"Skipping {sport} match {match_name or '(unnamed)'}: {'; '.join(reasons)}")
+    print(f"{len(records)} match(es) ready, {len(rejected)} rejected")
+
+    if args.dry_run:
+        dry_run(records, args.columns)
+        return len(records)
+
+    # Profiling measures the full cost of every match, so nothing is reused from earlier runs
+    profiling = args.profile or args.profile_memory
+
+    # Content-hash index of earlier posters, shared by every run and every day under this folder
+    index = None if args.no_dedupe or profiling else OutputIndex(os.path.join(folder_path, "poster_index.json"))
+
+    # Rendered panels are cached on disk and reused when their inputs have not changed. Recording
+    # skips the cache, since a cached banner would never be fetched and so never archived.
+    panel_cache = None if args.no_panel_cache or args.record_assets or profiling else PanelCache(os.path.join(folder_path, ".panel_cache"))
+
+    # Record every download into the day's asset archive, or serve them all from it
+    archive = None
+    if args.record_assets or args.replay_assets:
+        archive = AssetArchive(get_asset_archive_path(folder_path, day), 'record' if args.record_assets else 'replay')
+        use_asset_archive(archive)
+
+    # Per-match profiles go next to the posters. While profiling, matches are encoded and saved
+    # on the main thread so that cost shows up in their own profile.
+    profiler = None
+    if profiling:
+        profiler = BatchProfiler(os.path.join(day, "profile"), trace_memory=args.profile_memory)
+        set_page_workers(1)  # cProfile only sees the main thread
+
+    # Encoding and writing run on background threads while the next match renders
+    deadline_lead = timedelta(minutes=args.deadline_lead)
+    late = 0  # Pages saved late on the main thread; the pipeline counts the ones it saves
+    finished = False
+    try:
+        with PosterPipeline(encoders=args.encoders, index=index) as pipeline:
+            for record in schedule_matches(records, within_hours=None if backfill else args.within_hours):
+                deadline = None if backfill or record.kickoff is None else record.kickoff - deadline_lead
+                try:
+                    if profiler:
+                        late += profiler.run(f"{record.sport}_{record.league_name}_{record.event_name}", render_match, record, None, index, args.renditions, deadline, day,
+                                             panel_cache=panel_cache, columns=args.columns)
+                    else:
+                        render_match(record, pipeline, index, args.renditions, deadline, day, panel_cache=panel_cache, columns=args.columns)
+                except Exception as err:
+                    print(f"Couldn't generate poster for {record.event_name}")
+                    print(err)
+        finished = True
+    finally:
+        if archive:
+            # A recording cut short is dropped, keeping the day's previous archive
+            use_asset_archive(None)
+            archive.close(discard=not finished)
+
+    if archive:
+        print(archive.summary())
+
+    if profiler:
+        print(profiler.close())
+
+    if panel_cache:
+        print(panel_cache.summary())
+    print(canvas_pool.summary())
+
+    late += pipeline.late
+    if late:
+        print(f"{late} poster page(s) finished after their deadline")
+
+    if index:
+        index.save()
+        print(index.summary())
+    return len(records)
+
+
+def render_backfill_day(folder_path, day, args):
+    # Runs in a backfill worker process; fonts, measurements and downloaded logos and banners
+    # stay cached in the process for every later day it is given
+    try:
+        sports_matches = get_match_information(folder_path, day)
+    except Exception as err:
+        print(f"Couldn't load the json for {day}")
+        print(err)
+        return 0
+    if not sports_matches:
+        return 0
+    return run_day(folder_path, day, args, sports_matches, backfill=True)
+
+
+def run_backfill(folder_path, start_day, end_day, args, workers):
+    """Re-render every day from start_day to end_day (inclusive) that has a JSON file, spread over worker processes."""
+    start = datetime.strptime(start_day, '%Y-%m-%d')
+    end = datetime.strptime(end_day, '%Y-%m-%d')
+    days = []
+    while start <= end:
+        day = start.strftime('%Y-%m-%d')
+        file_path = os.path.join(folder_path, f"{day}.json")
+        if os.path.exists(file_path):
+            days.append((os.path.getsize(file_path), day))
+        start += timedelta(days=1)
+    if not days:
+        print(f"No match files found between {start_day} and {end_day}.")
+        return
+
+    # Biggest days first so the last ones to finish are short
+    days.sort(reverse=True)
+    began = time.perf_counter()
+    matches = 0
+    # Worker processes started with spawn (the default on macOS and Windows) don't inherit the module
+    # settings made in main(), so every worker applies them again
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(days))), initializer=apply_settings, initargs=(args,)) as executor:
+        futures = {executor.submit(render_backfill_day, folder_path, day, args): day for _, day in days}
+        for future in as_completed(futures):
+            try:
+                count = future.result()
+                matches += count
+                print(f"Backfilled {futures[future]}: {count} match(es)")
+            except Exception as err:
+                print(f"Couldn't backfill {futures[future]}")
+                print(err)
+    print(f"Backfill of {len(days)} day(s), {matches} match(es) took {time.perf_counter() - began:.1f}s")
+
+
+def apply_settings(args):
+    # Module-wide settings from the command line; also run in every backfill worker process
+    set_page_workers(args.page_workers)
+    set_compositor(args.compositor)
+    set_grayscale_posters(args.grayscale)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate match posters from today's JSON file.")
+    parser.add_argument('--dry-run', action='store_true', help="only report pages, sizes and font sizes, render nothing")
+    parser.add_argument('--no-dedupe', action='store_true', help="always encode and write posters, even if identical to an earlier one")
+    parser.add_argument('--no-panel-cache', action='store_true', help="render every panel from scratch instead of reusing cached panels")
+    parser.add_argument('--columns', choices=['1', 'auto'], default='1', help="'auto' flows long broadcaster lists into 2 or 3 columns when they fit")
+    parser.add_argument('--renditions', type=parse_renditions, default=[FULL_RENDITION], help="extra sizes to derive from each poster, e.g. social:600,thumb:256")
+    parser.add_argument('--deadline-lead', type=float, default=30, metavar='MINUTES', help="posters are due this many minutes before kickoff (default 30)")
+    parser.add_argument('--within-hours', type=float, metavar='N', help="only render events kicking off within the next N hours")
+    parser.add_argument('--profile', action='store_true', help="profile every match with cProfile into <date>/profile; turns off the panel cache and dedupe")
+    parser.add_argument('--profile-memory', action='store_true', help="profile as --profile does and also record top allocations with tracemalloc")
+    parser.add_argument('--queue-load', metavar='DB', help="load today's matches into the SQLite job queue DB and exit")
+    parser.add_argument('--work', metavar='DB', help="run as a worker rendering matches claimed from the job queue DB")
+    parser.add_argument('--queue-status', metavar='DB', help="print job queue progress and failures and exit")
+    parser.add_argument('--worker-id', default=f"{socket.gethostname()}:{os.getpid()}", help="name recorded on claimed jobs")
+    parser.add_argument('--lease', type=float, default=300, metavar='SECONDS', help="how long a claimed job stays leased (default 300)")
+    parser.add_argument('--max-attempts', type=int, default=3, help="attempts before a job whose lease keeps expiring is failed")
+    parser.add_argument('--record-assets', action='store_true', help="save every downloaded asset to <date>.assets.zip next to the JSON")
+    parser.add_argument('--replay-assets', action='store_true', help="serve every asset from <date>.assets.zip instead of the network")
+    parser.add_argument('--backfill', nargs=2, metavar=('START', 'END'), help="re-render every day from START to END (YYYY-MM-DD) that has a JSON file")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes for --backfill")
+    parser.add_argument('--page-workers', type=int, help="threads drawing, compositing and encoding the pages of one event (default: CPU count, 1 with --backfill)")
+    parser.add_argument('--grayscale', action='store_true', help="write posters without logos or banner as grayscale PNGs instead of RGB")
+    parser.add_argument('--compositor', choices=['pil', 'numpy'], default='pil', help="'numpy' reuses one output buffer per page in flight instead of a new canvas per page (needs numpy)")
+    parser.add_argument('--encoders', type=int, help="number of background PNG encoder threads (default: CPU count, 1 with --backfill)")
+    args = parser.parse_args(argv)
+    args.columns = 1 if args.columns == '1' else args.columns
+    # A backfill already runs a process per CPU, so each one keeps to a single page and encoder thread
+    if args.page_workers is None:
+        args.page_workers = 1 if args.backfill else os.cpu_count() or 1
+    if args.encoders is None:
+        args.encoders = 1 if args.backfill else os.cpu_count() or 2
+    apply_settings(args)
+    if args.record_assets and (args.replay_assets or args.work):
+        parser.error("--record-assets can't be combined with --replay-assets or --work")
+
     folder_path = "."  # Specify your folder path
+
+    if args.queue_status:
+        print_queue_status(args.queue_status)
+        return
+
+    if args.backfill:
+        run_backfill(folder_path, args.backfill[0], args.backfill[1], args, args.workers)
+        return
+
+    if args.work:
+        index = None if args.no_dedupe else OutputIndex(os.path.join(folder_path, "poster_index.json"))
+        panel_cache = None if args.no_panel_cache else PanelCache(os.path.join(folder_path, ".panel_cache"))
+        run_worker(args.work, args.worker_id, args.lease, args.max_attempts, index=index, renditions=args.renditions, panel_cache=panel_cache,
+                   replay_assets_from=folder_path if args.replay_assets else None, columns=args.columns)
+        if index:
+            index.save()
+        return
     
     # Get match information from the JSON file
+    sports_matches = None
     try:
         sports_matches = get_match_information(folder_path)
     except Exception as err:
         print(f"Couldn't load the json")
         print(err)
 
-    # Iterate through each sport and its matches to create posters
-    if sports_matches:
-        for sport, matches in sports_matches.items():
-            print(f"Processing matches for sport: {sport}")
-
-            for match_data in matches:
-                
-                for match_name, match_info in match_data.items():  # Use the match name as key
-                    try:
-                        # Extract the URLs for home and away team logos dynamically
-                        home_team_logo_url = match_info['strHomeTeamBadge']
-                        away_team_logo_url = match_info['strAwayTeamBadge']
-
-                        # Extract event details from the JSON
-                        event_name = match_name.rstrip(':')  # Use match name directly, remove trailing colon if present
-                        
-                        # Define the invalid characters (e.g., /, \, :, *, ?, ", <, >, |)
-                        invalid_chars = '/\\:*?"<>|'
-
-                        # Create a translation map that replaces each invalid character with an underscore (_)
-                        replacement_map = str.maketrans(invalid_chars, '-' * len(invalid_chars))
-
-                        # Sanitize the event_name by replacing invalid characters with underscores
-                        event_name = event_name.translate(replacement_map)
-
-                        venue = match_info['Venue']
-                        utc_time = match_info['UTC']
-                        date_event = match_info['dateEvent']
-                        date_event = date_event.replace('-','/')
-
-                        sources = match_info['Sources']
-                        if sources:
-                            sources = sources.replace(' ,', ',').replace(' , ', ',').replace(': ', ':')  # Clean up spaces
-                            sources_list = [source.strip() for source in sources.split(",")]  # Strip leading/trailing spaces after split
-
-                        else:
-                            sources = ['No sources found for this event']
-
-                        utc_time_formatted, uk_time_formatted = convert_time_zones(utc_time)
-
-                        home_team_logo = download_image(home_team_logo_url) if home_team_logo_url else None
-                        away_team_logo = download_image(away_team_logo_url) if away_team_logo_url else None
-
-                        league_banner_url = match_info['league_banner']
-                        league_name = match_info['strLeague']
-
-                        create_first_image(event_name, away_team_logo, home_team_logo, venue, date_event, uk_time_formatted, utc_time_formatted)
-                        create_second_image(event_name, sources_list)
-
-                        if league_banner_url:
-                            create_third_image(event_name, league_banner_url)
-                        
-                        if league_name is None:
-                            league_name = 'No_league'
-                        merge_images(event_name, sport, league_name)
-                    except Exception as err:
-                        event_name = match_name.rstrip(':')
-                        print(f"Couldn't generate poster for {event_name}")
-                        print(err)
-    else:
+    if not sports_matches:
         print("No match information found for today.")
+        return
+
+    if args.queue_load:
+        queue = JobQueue(args.queue_load)
+        try:
+            added = queue.load(get_today_date(), sports_matches)
+        finally:
+            queue.close()
+        print(f"Queued {added} new match(es) in {args.queue_load}")
+        return
+
+    run_day(folder_path, get_today_date(), args, sports_matches)
+
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,111 @@
+import json
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    day TEXT NOT NULL,
+    sport TEXT NOT NULL,
+    match_name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    kickoff TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated REAL,
+    UNIQUE (day, sport, match_name)
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, kickoff, id);
+"""
+
+
+class JobQueue:
+    """A table of poster jobs in SQLite that any number of worker processes claim with time-limited leases.
+
+    A job is 'pending' until a worker claims it, 'running' while the lease holds, and then
+    'done' or 'failed' (with the error text). A running job whose lease expires, for example
+    because its worker died, is handed out again until it has been attempted max_attempts
+    times. The database uses SQLite's default rollback journal rather than WAL, so it can
+    live on a volume shared between hosts as long as that volume supports file locking.
+    """
+
+    def __init__(self, db_path, timeout=60):
+        # Autocommit mode, with explicit BEGIN IMMEDIATE where a read must be followed by an update
+        self.conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def load(self, day, sports_matches):
+        """Add every match from get_match_information() output; matches already queued for the day are kept as they are."""
+        rows = []
+        for sport, matches in sports_matches.items():
+            for match_data in matches if isinstance(matches, list) else []:
+                for match_name, match_info in (match_data.items() if isinstance(match_data, dict) else []):
+                    kickoff = None
+                    if isinstance(match_info, dict) and match_info.get('dateEvent') and match_info.get('UTC'):
+                        kickoff = f"{match_info['dateEvent']} {match_info['UTC']}"  # Sorts correctly as text
+                    rows.append((day, sport, match_name, json.dumps(match_info), kickoff, time.time()))
+
+        self.conn.execute("BEGIN IMMEDIATE")
+        before = self.conn.total_changes
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO jobs (day, sport, match_name, payload, kickoff, updated) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        added = self.conn.total_changes - before
+        self.conn.execute("COMMIT")
+        return added
+
+    def claim(self, worker, lease_seconds=300, max_attempts=3):
+        """Lease the next job, earliest kickoff first, and return it as a dict; None when nothing is claimable."""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Jobs whose lease ran out too many times are not retried again
+            self.conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'lease expired after ' || attempts || ' attempt(s)', updated = ? "
+                "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?", (now, now, max_attempts))
+            row = self.conn.execute(
+                "SELECT * FROM jobs WHERE status = 'pending' OR (status = 'running' AND lease_expires < ?) "
+                "ORDER BY kickoff IS NULL, kickoff, id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, lease_expires = ?, attempts = attempts + 1, updated = ? WHERE id = ?",
+                (worker, now + lease_seconds, now, row['id']))
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        return job
+
+    def _finish(self, job_id, worker, status, error):
+        # Only the worker still holding the lease may finish the job
+        cursor = self.conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, lease_expires = NULL, updated = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (status, error, time.time(), job_id, worker))
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, worker):
+        return self._finish(job_id, worker, 'done', None)
+
+    def fail(self, job_id, worker, error):
+        return self._finish(job_id, worker, 'failed', error)
+
+    def progress(self, day=None):
+        """Return job counts per status and the failed jobs with their errors, optionally for one day."""
+        where, params = ("WHERE day = ?", (day,)) if day else ("", ())
+        counts = {'pending': 0, 'running': 0, 'done': 0, 'failed': 0}
+        for row in self.conn.execute(f"SELECT status, COUNT(*) AS n FROM jobs {where} GROUP BY status", params):
+            counts[row['status']] = row['n']
+        failed = [dict(row) for row in self.conn.execute(
+            f"SELECT day, sport, match_name, attempts, error FROM jobs {where} {'AND' if day else 'WHERE'} status = 'failed' ORDER BY id", params)]
+        return counts, failed
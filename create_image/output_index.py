@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves from concurrent processes are not serialized there
+    fcntl = None
+
+
+def pixel_digest(image):
+    # Hash the decoded pixels so identical posters are found before paying for PNG encoding
+    digest = hashlib.sha256(f"{image.mode}:{image.width}x{image.height}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class OutputIndex:
+    """Content-hash index of every poster written, persisted as JSON next to the output tree.
+
+    A page whose pixels match an earlier poster (from this run or any previous one) is
+    hardlinked to the existing file instead of being encoded and written again.
+    """
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.lock = threading.Lock()
+        self.entries = {}  # digest -> {'path', 'size', 'mtime_ns', 'encode_seconds'}
+        self.totals = {'hits': 0, 'bytes_saved': 0, 'encode_seconds_saved': 0.0}
+        self.run = {'hits': 0, 'misses': 0, 'bytes_saved': 0, 'encode_seconds_saved': 0.0}
+        self.unsaved = {'hits': 0, 'bytes_saved': 0, 'encode_seconds_saved': 0.0}  # Added to the file's totals on save
+
+        data = self._load()
+        self.entries = data.get('entries', {})
+        self.totals.update(data.get('stats', {}))
+
+        # Reverse map so a path that gets overwritten drops its old digest
+        self.paths = {entry['path']: digest for digest, entry in self.entries.items()}
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError) as err:
+            print(f"Ignoring unreadable output index {self.index_path}")
+            print(err)
+            return {}
+
+    def find(self, digest):
+        """Return the index entry for an identical poster that still exists on disk, or None."""
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is None:
+                self.run['misses'] += 1
+                return None
+            try:
+                stat = os.stat(entry['path'])
+            except OSError:
+                stat = None
+            # The file must still be the one we wrote, not a later overwrite or a deletion
+            if stat is None or stat.st_size != entry['size'] or stat.st_mtime_ns != entry['mtime_ns']:
+                self._forget(digest)
+                self.run['misses'] += 1
+                return None
+            return dict(entry)
+
+    def link(self, entry, save_path):
+        """Point save_path at the existing poster, by hardlink where possible and by copy otherwise."""
+        existing_path = entry['path']
+        if os.path.exists(save_path) and os.path.samefile(existing_path, save_path):
+            linked = False  # Already the same file, e.g. re-running the same day; no storage is saved
+        else:
+            linked = True
+            directory = os.path.dirname(save_path) or "."
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = os.path.join(directory, f".{os.path.basename(save_path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+            try:
+                os.link(existing_path, tmp_path)
+            except OSError:
+                shutil.copyfile(existing_path, tmp_path)  # Different filesystem or no hardlink support
+            os.replace(tmp_path, save_path)
+
+        with self.lock:
+            for stats in (self.run, self.totals, self.unsaved):
+                stats['hits'] += 1
+                stats['bytes_saved'] += entry['size'] if linked else 0
+                stats['encode_seconds_saved'] += entry['encode_seconds']
+
+    def add(self, digest, save_path, encode_seconds):
+        stat = os.stat(save_path)
+        with self.lock:
+            old_digest = self.paths.get(save_path)
+            if old_digest is not None:
+                self._forget(old_digest)
+            self.entries[digest] = {'path': save_path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'encode_seconds': encode_seconds}
+            self.paths[save_path] = digest
+
+    def _forget(self, digest):
+        entry = self.entries.pop(digest, None)
+        if entry and self.paths.get(entry['path']) == digest:
+            del self.paths[entry['path']]
+
+    def save(self):
+        # Other processes (queue workers, backfill days) may save the same index, so merge with the
+        # file on disk under an exclusive lock on a sidecar file; our own entries win for any path we wrote
+        with open(f"{self.index_path}.lock", 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)  # Released when the file is closed
+            self._merge_and_write()
+
+    def _merge_and_write(self):
+        on_disk = self._load()
+        with self.lock:
+            entries = {digest: entry for digest, entry in on_disk.get('entries', {}).items() if entry['path'] not in self.paths}
+            entries.update(self.entries)
+            totals = {'hits': 0, 'bytes_saved': 0, 'encode_seconds_saved': 0.0}
+            totals.update(on_disk.get('stats', {}))
+            for key, value in self.unsaved.items():
+                totals[key] += value
+                self.unsaved[key] = 0
+            self.entries, self.totals = entries, totals
+            self.paths = {entry['path']: digest for digest, entry in entries.items()}
+            data = json.dumps({'stats': totals, 'entries': entries}, indent=1)
+        from pipeline import write_atomic  # pipeline imports this module
+        write_atomic(self.index_path, data.encode())
+
+    def summary(self):
+        run = self.run
+        return (f"Dedupe: {run['hits']} poster(s) reused, {run['misses']} encoded, "
+                f"saved {run['bytes_saved'] / 1024 / 1024:.1f} MB and {run['encode_seconds_saved']:.1f}s of encoding "
+                f"({self.totals['hits']} reused, {self.totals['bytes_saved'] / 1024 / 1024:.1f} MB saved in total)")
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from pipeline import write_atomic
+
+
+class PanelCache:
+    """On-disk cache of rendered poster panels, keyed by the inputs each panel depends on.
+
+    Every entry is one or more lossless PNG pages plus a small manifest that is written
+    last, so a half-written entry is never read back. Panels keep their mode (L or RGB).
+    Reading an entry touches its manifest, and opening the cache prunes entries unused for
+    max_age_days, then the least recently used ones until it is within max_bytes.
+    """
+
+    def __init__(self, cache_dir, max_age_days=14, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'pruned': 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        self.prune(max_age_days, max_bytes)
+
+    @staticmethod
+    def key(kind, *inputs):
+        # Inputs must be JSON serializable; the kind keeps different panels with equal inputs apart
+        return hashlib.sha256(json.dumps([kind, *inputs], sort_keys=True).encode()).hexdigest()
+
+    def _path(self, kind, key, suffix):
+        return os.path.join(self.cache_dir, f"{kind}_{key}{suffix}")
+
+    def prune(self, max_age_days, max_bytes):
+        """Delete entries unused for max_age_days, then the least recently used ones until the cache fits in max_bytes."""
+        entries = {}  # "kind_key" -> {'used', 'size', 'files'}
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # Removed by another process in the meantime
+            stem, suffix = os.path.splitext(name)
+            entry_name = stem if suffix == ".json" else stem.rpartition("_")[0]
+            if name.startswith(".") or not entry_name:
+                entry_name = name  # Leftover temp file, pruned by its own age
+            entry = entries.setdefault(entry_name, {'used': None, 'newest': 0, 'size': 0, 'files': []})
+            entry['size'] += stat.st_size
+            entry['files'].append(path)
+            entry['newest'] = max(entry['newest'], stat.st_mtime)
+            if suffix == ".json":
+                entry['used'] = stat.st_mtime
+
+        # An entry was last used when its manifest was last touched; pages without a manifest (a put
+        # in progress, or one that died) go by their own age
+        for entry in entries.values():
+            entry['used'] = entry['used'] or entry['newest']
+        by_age = sorted(entries.values(), key=lambda entry: entry['used'])
+        total = sum(entry['size'] for entry in by_age)
+        for entry in by_age:
+            if entry['used'] >= now - max_age_days * 86400 and total <= max_bytes:
+                break
+            # Manifest first, so a reader never finds an entry with missing pages
+            for path in sorted(entry['files'], key=lambda path: not path.endswith(".json")):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= entry['size']
+            self.stats['pruned'] += 1
+
+    def get(self, kind, key):
+        """Return the cached list of panel images, or None."""
+        try:
+            manifest_path = self._path(kind, key, ".json")
+            with open(manifest_path, 'r') as file:
+                pages = json.load(file)['pages']
+            images = []
+            for page in range(pages):
+                with Image.open(self._path(kind, key, f"_{page}.png")) as image:
+                    image.load()
+                    images.append(image.copy() if image.mode in ("L", "RGB") else image.convert("RGB"))
+            os.utime(manifest_path)  # Marks the entry as recently used for prune()
+            return images
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, kind, key, images):
+        for page, image in enumerate(images):
+            buffer = BytesIO()
+            image.save(buffer, format="PNG", compress_level=1)  # Fast to write, still lossless
+            write_atomic(self._path(kind, key, f"_{page}.png"), buffer.getvalue())
+        write_atomic(self._path(kind, key, ".json"), json.dumps({'pages': len(images)}).encode())
+
+    def get_or_render(self, kind, key, render):
+        """Return the cached panels for key, or call render() for a list of panels and cache it."""
+        images = self.get(kind, key)
+        with self.lock:
+            self.stats['hits' if images is not None else 'misses'] += 1
+        if images is None:
+            images = render()
+            self.put(kind, key, images)
+        return images
+
+    def summary(self):
+        return f"Panel cache: {self.stats['hits']} panel(s) reused, {self.stats['misses']} rendered, {self.stats['pruned']} old entries pruned"
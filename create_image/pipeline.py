@@ -0,0 +1,182 @@
+import os
+import queue
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from io import BytesIO
+
+from output_index import pixel_digest
+
+# Marker pushed into a queue to tell the thread reading it to stop
+_STOP = object()
+
+# mkstemp() creates files readable by their owner only; new files get the mode a plain open()
+# would give them instead. The umask can only be read by setting it, so that happens once here.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+
+def encode_png(image):
+    # Encode an image to PNG bytes in memory
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_temp_file(directory):
+    """Create a hidden temp file in directory, with the permissions open() would give it; returns (fd, path)."""
+    fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=directory)
+    os.chmod(tmp_path, FILE_MODE)
+    return fd, tmp_path
+
+
+def write_atomic(path, data):
+    """Write data to path through a hidden temp file in the same directory and rename it into place."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = make_temp_file(directory)
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)  # Readers only ever see the old file or the complete new one
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def prepare_poster(image, index=None):
+    """Encode the image, or find an identical poster already on disk when an output index is given."""
+    digest = pixel_digest(image) if index else None
+    existing = index.find(digest) if index else None
+    if existing:
+        return {'digest': digest, 'existing': existing}
+    start = time.perf_counter()
+    data = encode_png(image)
+    return {'digest': digest, 'data': data, 'encode_seconds': time.perf_counter() - start}
+
+
+def store_poster(save_path, prepared, index=None):
+    # Hardlink to the identical poster if there is one, otherwise write the new bytes
+    if prepared.get('existing'):
+        index.link(prepared['existing'], save_path)
+        return
+    write_atomic(save_path, prepared['data'])
+    if index:
+        index.add(prepared['digest'], save_path, prepared['encode_seconds'])
+
+
+def save_poster(save_path, image, index=None):
+    # Synchronous version of the encode and write stages
+    store_poster(save_path, prepare_poster(image, index), index)
+
+
+def check_deadline(save_path, deadline):
+    """Log a poster that was saved after its deadline; returns True if it was late."""
+    if deadline is None:
+        return False
+    finished = datetime.now(timezone.utc)
+    if finished <= deadline:
+        return False
+    minutes = (finished - deadline).total_seconds() / 60
+    print(f"Late: {save_path} finished {minutes:.1f} min after its {deadline:%H:%M} UTC deadline")
+    return True
+
+
+def release_after(count, release, image):
+    """Return a callback for submit() that calls release(image) only on the last of count calls.
+
+    Several renditions of one page are encoded separately, but their merged canvas must go back
+    exactly once, after every encode that may read it has finished.
+    """
+    lock = threading.Lock()
+    remaining = [count]
+
+    def release_one(_encoded):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            release(image)
+    return release_one
+
+
+class PosterPipeline:
+    """Encode and write posters on background threads while the main thread keeps rendering.
+
+    Rendered images go through a bounded queue to a pool of encoder threads, and the
+    encoded bytes through a second bounded queue to a single writer thread. Full queues
+    block submit(), so rendering never runs far ahead of the disk. With an OutputIndex,
+    pages identical to an existing poster skip encoding and are hardlinked instead.
+    """
+
+    def __init__(self, encoders=2, queue_size=8, index=None):
+        self.index = index
+        self.encode_queue = queue.Queue(maxsize=queue_size)
+        self.write_queue = queue.Queue(maxsize=queue_size)
+        self.errors = []
+        self.saved = 0
+        self.late = 0
+        self.encoders = [threading.Thread(target=self._encode_worker, daemon=True) for _ in range(max(1, encoders))]
+        self.writer = threading.Thread(target=self._write_worker, daemon=True)
+        for thread in self.encoders:
+            thread.start()
+        self.writer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def submit(self, save_path, image, deadline=None, release=None):
+        # Blocks while the encoders are busy and the queue is full. release(image) is called
+        # once the image has been encoded, so its canvas can be reused; see release_after().
+        self.encode_queue.put((save_path, image, deadline, release))
+
+    def _encode_worker(self):
+        while True:
+            job = self.encode_queue.get()
+            if job is _STOP:
+                return
+            save_path, image, deadline, release = job
+            try:
+                prepared = prepare_poster(image, self.index)
+            except Exception as err:
+                self._record_error(save_path, err)
+                continue
+            finally:
+                if release:
+                    release(image)
+            self.write_queue.put((save_path, prepared, deadline))
+
+    def _write_worker(self):
+        while True:
+            job = self.write_queue.get()
+            if job is _STOP:
+                return
+            save_path, prepared, deadline = job
+            try:
+                store_poster(save_path, prepared, self.index)
+                self.saved += 1
+                print(f"Saved merged image to {save_path}")
+                if check_deadline(save_path, deadline):
+                    self.late += 1
+            except Exception as err:
+                self._record_error(save_path, err)
+
+    def _record_error(self, save_path, err):
+        print(f"Couldn't save {save_path}")
+        print(err)
+        self.errors.append((save_path, err))
+
+    def close(self):
+        # Drain everything already submitted, then stop the encoders before the writer
+        for _ in self.encoders:
+            self.encode_queue.put(_STOP)
+        for thread in self.encoders:
+            thread.join()
+        self.write_queue.put(_STOP)
+        self.writer.join()
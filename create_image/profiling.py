@@ -0,0 +1,95 @@
+import cProfile
+import os
+import pstats
+import time
+import tracemalloc
+from io import StringIO
+
+# Functions worth calling out in the batch summary; C methods match as "<method 'name' ...>"
+HOTSPOTS = ('download_image', 'truetype', 'textbbox', 'render', 'resize', 'paste', 'convert', 'save', 'encode')
+
+
+class BatchProfiler:
+    """Profile each match separately with cProfile (and optionally tracemalloc).
+
+    Writes one .pstats file, plus a top-allocations report when memory tracing is on,
+    per match into profile_dir, and a summary of the slowest events and dominant
+    functions for the whole batch.
+    """
+
+    def __init__(self, profile_dir, trace_memory=False, top=15):
+        self.profile_dir = profile_dir
+        self.trace_memory = trace_memory
+        self.top = top
+        self.timings = []  # (seconds, label, pstats path)
+        os.makedirs(profile_dir, exist_ok=True)
+        if trace_memory:
+            tracemalloc.start(10)
+
+    def _file_stem(self, label):
+        # Labels are already sanitized event names, but may contain path separators from the sport or league.
+        # The run number keeps same-named events from overwriting each other's files.
+        return os.path.join(self.profile_dir, f"{len(self.timings) + 1:03d}_{label.replace(os.sep, '-')}")
+
+    def run(self, label, function, *args, **kwargs):
+        """Call function under the profiler and record how long it took."""
+        profile = cProfile.Profile()
+        if self.trace_memory:
+            tracemalloc.clear_traces()  # Only report what this match allocates
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            return profile.runcall(function, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            stem = self._file_stem(label)
+            profile.dump_stats(f"{stem}.pstats")
+            self.timings.append((elapsed, label, f"{stem}.pstats"))
+            if self.trace_memory:
+                self._write_allocations(f"{stem}.allocations.txt", label)
+
+    def _write_allocations(self, path, label):
+        peak = tracemalloc.get_traced_memory()[1]
+        # Leave out the profiler's own bookkeeping
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ])
+        with open(path, 'w') as file:
+            file.write(f"Top allocations still held after {label} (peak traced {peak / 1024 / 1024:.1f} MB)\n")
+            for stat in snapshot.statistics('lineno')[:self.top]:
+                file.write(f"{stat}\n")
+
+    def summary(self):
+        """Return the batch report: slowest events, then the functions dominating all of them."""
+        lines = [f"Profiled {len(self.timings)} event(s), {sum(t[0] for t in self.timings):.2f}s in total", "", "Slowest events:"]
+        for elapsed, _, path in sorted(self.timings, reverse=True)[:self.top]:
+            lines.append(f"  {elapsed:8.3f}s  {os.path.basename(path)}")
+
+        if self.timings:
+            stats = pstats.Stats(*[path for _, _, path in self.timings], stream=StringIO())
+            rows = []
+            for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.stats.items():
+                rows.append((tottime, cumtime, calls, f"{name} ({os.path.basename(filename)}:{line})", name))
+            rows.sort(reverse=True)
+
+            lines += ["", "Functions by own time:"]
+            for tottime, cumtime, calls, where, _ in rows[:self.top]:
+                lines.append(f"  {tottime:8.3f}s own {cumtime:8.3f}s cumulative {calls:8d} calls  {where}")
+
+            lines += ["", "Known hotspots:"]
+            for hotspot in HOTSPOTS:
+                matching = [row for row in rows if row[4] == hotspot or row[4].startswith(f"<method '{hotspot}'")]
+                if matching:
+                    cumtime = sum(row[1] for row in matching)
+                    calls = sum(row[2] for row in matching)
+                    lines.append(f"  {hotspot:10s} {cumtime:8.3f}s cumulative, {calls} calls")
+        return "\n".join(lines)
+
+    def close(self):
+        report = self.summary()
+        with open(os.path.join(self.profile_dir, "summary.txt"), 'w') as file:
+            file.write(report + "\n")
+        if self.trace_memory:
+            tracemalloc.stop()
+        return report
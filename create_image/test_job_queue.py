@@ -0,0 +1,67 @@
+"""Several --work processes drain a job queue in a temp directory, including a job whose worker died.
+
+Run with `python test_job_queue.py` or pytest. The matches have no logos or banner, so nothing is downloaded.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from job_queue import JobQueue
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DAY = '2026-01-10'
+MATCHES = 12
+WORKERS = 3
+
+
+def make_matches(count):
+    # Same shape as a day's JSON file
+    matches = []
+    for number in range(count):
+        matches.append({f"Team {number} A vs Team {number} B": {
+            'strHomeTeamBadge': None, 'strAwayTeamBadge': None, 'Venue': f"Stadium {number}",
+            'UTC': f"{number % 24:02d}:00:00", 'dateEvent': DAY,
+            'Sources': "United Kingdom: Sky Sports Main Event, Spain: DAZN 1, Germany: Sky Sport 1",
+            'league_banner': None, 'strLeague': 'Test League'}})
+    return {'Soccer': matches}
+
+
+def test_workers_finish_every_job():
+    with tempfile.TemporaryDirectory() as folder:
+        for font in ('Gagalin.otf', 'OpenSans-Bold.otf'):
+            shutil.copy(os.path.join(HERE, font), folder)
+        db_path = os.path.join(folder, 'jobs.db')
+
+        queue = JobQueue(db_path)
+        try:
+            assert queue.load(DAY, make_matches(MATCHES)) == MATCHES
+            # A worker that dies right after claiming: its lease runs out and the job is handed out again
+            crashed = queue.claim('crashed', lease_seconds=1)
+        finally:
+            queue.close()
+
+        command = [sys.executable, os.path.join(HERE, 'generate_poster.py'), '--work', db_path, '--no-dedupe', '--no-panel-cache',
+                   '--page-workers', '1', '--encoders', '1']
+        workers = [subprocess.Popen(command + ['--worker-id', f"worker-{number}"], cwd=folder, stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT, text=True) for number in range(WORKERS)]
+        outputs = [worker.communicate(timeout=300)[0] for worker in workers]
+        assert all(worker.returncode == 0 for worker in workers), "\n".join(outputs)
+
+        queue = JobQueue(db_path)
+        try:
+            counts, failed = queue.progress()
+            retried = queue.conn.execute("SELECT worker, attempts FROM jobs WHERE id = ?", (crashed['id'],)).fetchone()
+        finally:
+            queue.close()
+        assert counts == {'pending': 0, 'running': 0, 'done': MATCHES, 'failed': 0}, (counts, failed)
+        assert retried['worker'] != 'crashed' and retried['attempts'] == 2
+
+        posters = {name for _, _, names in os.walk(os.path.join(folder, DAY)) for name in names if name.endswith('.png')}
+        assert {f"Team {number} A vs Team {number} B_poster_1.png" for number in range(MATCHES)} <= posters
+
+
+if __name__ == '__main__':
+    test_workers_finish_every_job()
+    print("ok")
@@ -0,0 +1,86 @@
+"""Merged posters go back to the canvas pool (or compositor) exactly once, after their last rendition is encoded.
+
+Run with `python test_merge_release.py` or pytest. Everything is drawn in memory, nothing is downloaded.
+"""
+import os
+import tempfile
+from collections import Counter
+
+from PIL import Image
+
+import generate_poster
+from compositor import PosterCompositor
+from pipeline import PosterPipeline, release_after
+
+RENDITIONS = [generate_poster.FULL_RENDITION, generate_poster.Rendition('social', 600), generate_poster.Rendition('thumb', 256)]
+SHADES = (40, 120, 200)
+
+
+def make_panels():
+    first = Image.new("RGB", (1024, 341), (200, 0, 0))
+    second = [Image.new("L", (1024, 300), shade) for shade in SHADES]
+    third = Image.new("RGB", (1024, 100), (0, 0, 200))
+    return first, second, third
+
+
+def merge_and_count_releases(folder, compositor, encoders):
+    # Count every release of every merged image, whichever path it takes back
+    releases = Counter()
+    pool_release, compositor_release = generate_poster.canvas_pool.release, PosterCompositor.release
+
+    def count_pool(canvas):
+        releases[id(canvas)] += 1
+        pool_release(canvas)
+
+    def count_compositor(self, merged_image):
+        releases[id(merged_image)] += 1
+        compositor_release(self, merged_image)
+
+    generate_poster.canvas_pool.release = count_pool
+    PosterCompositor.release = count_compositor
+    generate_poster.set_compositor(compositor)
+    try:
+        first, second, third = make_panels()
+        with PosterPipeline(encoders=encoders) as pipeline:
+            generate_poster.merge_images("Event", "Sport", "League", first, second, third, pipeline, renditions=RENDITIONS, output_date=folder)
+    finally:
+        del generate_poster.canvas_pool.release
+        PosterCompositor.release = compositor_release
+        generate_poster.set_compositor('pil')
+    return releases
+
+
+def test_release_after_calls_once_on_the_last_call():
+    released = []
+    callback = release_after(3, released.append, "merged")
+    for _ in range(3):
+        callback("rendition")
+    assert released == ["merged"]
+
+
+def test_every_page_is_released_once_and_saved_intact():
+    compositors = ['pil', 'numpy'] if PosterCompositor.available() else ['pil']
+    for compositor in compositors:
+        for encoders in (1, 4):
+            with tempfile.TemporaryDirectory() as folder:
+                releases = merge_and_count_releases(folder, compositor, encoders)
+                # A pooled canvas may come back for a later page, so count releases rather than distinct canvases
+                assert sum(releases.values()) == len(SHADES), (compositor, encoders, releases)
+
+                save_dir = os.path.join(folder, "Sport", "League")
+                for page, shade in enumerate(SHADES):
+                    with Image.open(os.path.join(save_dir, f"Event_poster_{page + 1}.png")) as poster:
+                        assert poster.size == (1024, 741)
+                        # A canvas cleared or reused before this poster was encoded would show here
+                        assert poster.getpixel((512, 10)) == (200, 0, 0), (compositor, encoders, page)
+                        assert poster.getpixel((512, 341 + 150)) == (shade, shade, shade), (compositor, encoders, page)
+                        assert poster.getpixel((512, 740)) == (0, 0, 200), (compositor, encoders, page)
+                    for rendition in RENDITIONS[1:]:
+                        with Image.open(os.path.join(save_dir, f"Event_poster_{page + 1}_{rendition.name}.png")) as image:
+                            assert image.width == rendition.width
+
+
+if __name__ == '__main__':
+    test_release_after_calls_once_on_the_last_call()
+    test_every_page_is_released_once_and_saved_intact()
+    print("ok")